@@ -37,7 +37,8 @@ if user is None:
 
         if st.form_submit_button("Start My Journey"):
             if name:
-                save_profile(name, age, gender, height, weight, act, goal, w_goal)
+                st.session_state["user"] = save_profile(name, age, gender, height, weight, act, goal, w_goal)
+                st.rerun()
             else:
                 st.error("Please enter your name.")
 
@@ -70,7 +71,7 @@ else:
     if page == "🏠 Dashboard":
         show_ad_dashboard(user)
     elif page == "🍎 Food Log":
-        show_food_log(df_food)
+        show_food_log(df_food, user)
     elif page == "💧 Hydration":
         show_hydration(user)
     elif page == "🏃 Fitness":
@@ -0,0 +1,320 @@
+"""Headless load test for app.py.
+
+Starts app.py with `streamlit run` in a throwaway data folder and connects many
+simulated browser sessions to that one server process over Streamlit's websocket
+protocol, `--users` of them at a time. Reports rerun latency percentiles as seen
+by the sessions, throughput and the server's memory growth.
+
+Each session follows a seeded, scripted journey, so the actions are reproducible.
+With more than one user their interleaving is not, because that is what is being
+measured: how the server copes with concurrent sessions on one data folder.
+
+    python loadtest.py --sessions 50 --users 10 --seed 1
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from websockets.sync.client import connect
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+REFERENCE_FILES = ["Enhanced_Indian_Food_Nutrition.csv", "Compendium_of_Physical_Activities_2024.csv",
+                   "symptom_database.csv"]
+PAGES = ["🏠 Dashboard", "🍎 Food Log", "💧 Hydration", "🏃 Fitness", "🔮 Meal Planner", "🩺 Health Advisor",
+         "📈 Analytics", "⚙️ Settings"]
+FOOD_SEARCHES = ["Paneer", "Rice", "Chicken", "Dal", "Roti", "Egg", "Tea"]
+ACTIVITY_SEARCHES = ["walk", "run", "yoga", ""]
+# script_finished status of a run that st.rerun() cut short; the session keeps reading until the run it started ends
+FINISHED_EARLY_FOR_RERUN = 2
+
+
+class Widget:
+    """A widget of the session's last rendered page; setting a value takes effect on the next rerun."""
+
+    def __init__(self, session, kind, proto):
+        self.session, self.kind, self.proto = session, kind, proto
+
+    def _set(self, field, value):
+        state = WidgetState(id=self.proto.id)
+        setattr(state, field, value)
+        self.session.values[self.proto.id] = state
+        return self
+
+    def input(self, text):
+        return self._set("string_value", text)
+
+    def set_value(self, value):
+        if self.kind == "radio":
+            return self._set("string_value", value)
+        return self._set("double_value", float(value))
+
+    def click(self):
+        return self._set("trigger_value", True)
+
+
+class Session:
+    """One simulated browser session; records how long every rerun takes."""
+
+    def __init__(self, sid, seed, url, timeout):
+        self.sid = sid
+        self.rng = random.Random(seed * 100_003 + sid)
+        self.url = url
+        self.timeout = timeout
+        self.ws = None
+        self._connection = contextlib.ExitStack()
+        self.elements = {}  # delta path -> (element kind, proto) of the last finished run
+        self.values = {}  # widget id -> WidgetState the "browser" sends with every rerun
+        self.timings = []
+        self.errors = 0
+        self.failures = []
+        self.step = None
+
+    def run(self, step, action=None):
+        self.step = step
+        if action: action()
+        if self.ws is None:
+            self.ws = self._connection.enter_context(
+                connect(self.url, subprotocols=["streamlit"], max_size=None, open_timeout=self.timeout))
+        msg = BackMsg()
+        msg.rerun_script.widget_states.widgets.extend(self.values.values())
+
+        start = time.perf_counter()
+        self.ws.send(msg.SerializeToString())
+        elements = {}
+        while True:
+            fwd = ForwardMsg()
+            fwd.ParseFromString(self.ws.recv(timeout=self.timeout))
+            kind = fwd.WhichOneof("type")
+            if kind == "delta" and fwd.delta.WhichOneof("type") == "new_element":
+                el_kind = fwd.delta.new_element.WhichOneof("type")
+                elements[tuple(fwd.metadata.delta_path)] = (el_kind, getattr(fwd.delta.new_element, el_kind))
+            elif kind == "script_finished":
+                if fwd.script_finished == FINISHED_EARLY_FOR_RERUN:
+                    elements = {}
+                    continue
+                break
+        self.timings.append((step, time.perf_counter() - start))
+        self.elements = elements
+        # Like a browser, forget widgets that are gone and clicks that were handled
+        shown = {proto.id for _, proto in elements.values() if getattr(proto, "id", "")}
+        self.values = {k: v for k, v in self.values.items() if k in shown and v.WhichOneof("value") != "trigger_value"}
+        self.errors += sum(el_kind == "exception" for el_kind, _ in elements.values())
+
+    def widget(self, kind, label, sidebar=False):
+        return next((Widget(self, kind, proto) for path, (el_kind, proto) in sorted(self.elements.items())
+                     if el_kind == kind and proto.label == label and (path[0] == 1) == sidebar), None)
+
+    def attempt(self, journey_step):
+        """Runs one journey step; a harness-side failure is recorded (with the last rerun started) instead of
+        ending the session."""
+        self.step = None
+        try:
+            journey_step(self)
+        except Exception as e:
+            self.failures.append({"session": self.sid, "journey": journey_step.__name__, "last_step": self.step,
+                                  "error": f"{type(e).__name__}: {e}"})
+
+    def goto(self, page):
+        self.run(f"page {page}", lambda: self.widget("radio", "Navigate", sidebar=True).set_value(page))
+
+    def close(self):
+        self._connection.close()
+
+
+# --- Journey steps ---
+
+def onboard(s):
+    s.run("open")
+    if s.widget("text_input", "First Name") is not None:
+        s.widget("text_input", "First Name").input(f"User{s.sid}")
+        s.widget("number_input", "Weight (kg)").set_value(s.rng.randint(50, 100))
+        s.run("onboard", s.widget("button", "Start My Journey").click)
+
+
+def log_meal(s):
+    s.goto("🍎 Food Log")
+    s.run("search food", lambda: s.widget("text_input", "Search Database").input(s.rng.choice(FOOD_SEARCHES)))
+    if s.widget("button", "Add to Log") is not None:
+        s.widget("number_input", "Quantity (Servings)").set_value(s.rng.choice([0.5, 1.0, 1.5, 2.0]))
+        s.run("log meal", s.widget("button", "Add to Log").click)
+
+
+def log_drink(s):
+    s.goto("💧 Hydration")
+    s.widget("number_input", "Volume (ml)").set_value(s.rng.choice([150, 250, 500]))
+    s.run("log drink", s.widget("button", "Log Drink").click)
+
+
+def log_workout(s):
+    s.goto("🏃 Fitness")
+    s.run("search activity", lambda: s.widget("text_input", "Search Activity").input(s.rng.choice(ACTIVITY_SEARCHES)))
+    if s.widget("button", "Log Workout") is not None:
+        s.run("log workout", s.widget("button", "Log Workout").click)
+
+
+def browse(s):
+    s.goto(s.rng.choice(PAGES))
+
+
+def view_analytics(s):
+    s.goto("📈 Analytics")
+
+
+def run_journey(sid, seed, steps, url, timeout):
+    s = Session(sid, seed, url, timeout)
+    s.attempt(onboard)
+    actions = [log_meal, log_meal, log_drink, log_workout, browse, browse, view_analytics]
+    for _ in range(steps):
+        s.attempt(s.rng.choice(actions))
+    s.attempt(view_analytics)
+    s.close()
+    return s
+
+
+# --- Server ---
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(data_dir, timeout):
+    """Runs app.py with `streamlit run` in data_dir; returns the process and its websocket URL once it is up."""
+    port = _free_port()
+    log_path = os.path.join(data_dir, "streamlit.log")
+    with open(log_path, "w") as log:
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", os.path.join(APP_DIR, "app.py"),
+             "--server.headless", "true", "--server.address", "127.0.0.1", "--server.port", str(port),
+             "--server.fileWatcherType", "none", "--server.enableXsrfProtection", "false",
+             "--browser.gatherUsageStats", "false"],
+            cwd=data_dir, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as r:
+                if r.status == 200: break
+        except OSError:
+            pass
+        if proc.poll() is not None or time.monotonic() > deadline:
+            proc.kill()
+            raise RuntimeError(f"streamlit did not start; see {log_path}")
+        time.sleep(0.2)
+    return proc, f"ws://127.0.0.1:{port}/_stcore/stream"
+
+
+def stop_server(proc):
+    # SIGTERM lets Streamlit shut down cleanly, so the app's write queue is flushed at exit
+    proc.terminate()
+    try:
+        proc.wait(30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def _rss_mb(pid):
+    """Resident memory of a process in MB, or None where it can't be read (no psutil and no /proc)."""
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss / 2**20
+    except ImportError:
+        pass
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def summarize(sessions, wall, users, rss_before, rss_after):
+    timings = [t for s in sessions for t in s.timings]
+    lat = np.array([d for _, d in timings]) * 1000
+    by_step = {}
+    for step, d in timings:
+        by_step.setdefault(step, []).append(d * 1000)
+    failures = [f for s in sessions for f in s.failures]
+    by_failure = {}
+    for f in failures:
+        kind = f"{f['journey']} after {f['last_step']}: {f['error'].split(':')[0]}"
+        by_failure[kind] = by_failure.get(kind, 0) + 1
+
+    pct = lambda a: {f"p{q}": round(float(np.percentile(a, q)), 1) for q in (50, 90, 95, 99)}
+    mb = lambda v: None if v is None else round(v, 1)
+    return {
+        "sessions": len(sessions),
+        "concurrent_users": users,
+        "reruns": len(timings),
+        "errors": sum(s.errors for s in sessions),
+        "failed_steps": len(failures),
+        "failed_steps_by_kind": dict(sorted(by_failure.items())),
+        "failures": failures[:20],
+        "wall_s": round(wall, 2),
+        "reruns_per_s": round(len(timings) / wall, 2),
+        "sessions_per_s": round(len(sessions) / wall, 3),
+        "latency_ms": {**pct(lat), "max": round(float(lat.max()), 1)} if len(lat) else {},
+        "latency_ms_by_step": {k: pct(v) for k, v in sorted(by_step.items())},
+        "server_rss_mb": {"before": mb(rss_before), "after": mb(rss_after),
+                          "growth": mb(rss_after - rss_before) if None not in (rss_before, rss_after) else None},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=20, help="simulated sessions in total")
+    parser.add_argument("--users", type=int, default=5, help="sessions connected to the server at the same time")
+    parser.add_argument("--steps", type=int, default=8, help="scripted actions per session after onboarding")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=60, help="seconds allowed per rerun")
+    parser.add_argument("--data-dir", help="folder for the app's data files (default: a temporary folder)")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="fitlife_load_")
+    os.makedirs(data_dir, exist_ok=True)
+    for f in REFERENCE_FILES:
+        shutil.copy(os.path.join(APP_DIR, f), data_dir)
+    proc, url = start_server(data_dir, args.timeout)
+    try:
+        # The first session onboards alone so the rest share one profile, like one user on many devices
+        run_journey(-1, args.seed, 0, url, args.timeout)
+
+        rss_before = _rss_mb(proc.pid)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.users) as pool:
+            sessions = list(pool.map(lambda sid: run_journey(sid, args.seed, args.steps, url, args.timeout),
+                                     range(args.sessions)))
+        wall = time.perf_counter() - start
+        report = summarize(sessions, wall, args.users, rss_before, _rss_mb(proc.pid))
+    finally:
+        stop_server(proc)
+    report.update(seed=args.seed)
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.json:
+        with open(args.json, "w") as f: json.dump(report, f, indent=2, ensure_ascii=False)
+    if not args.data_dir:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return report
+
+
+if __name__ == "__main__":
+    main()
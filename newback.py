@@ -1,55 +1,95 @@
 
 import pandas as pd
+import numpy as np
 import json
 import os
+import shutil
+import threading
+import queue
+import uuid
+import atexit
+import time
+import zipfile
+import hashlib
+import logging
 import streamlit as st
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import plotly.express as px
 import plotly.graph_objects as go
+
+logger = logging.getLogger(__name__)
+
 FILES = {
     "profile": "user_profile.json",
-    "food_log": "food_log.csv",
-    "exercise_log": "exercise_log.csv",
-    "water_log": "water_log_detailed.csv",
-    "weight_log": "weight_log.csv",
+    "food_log": "food_log",
+    "exercise_log": "exercise_log",
+    "water_log": "water_log_detailed",
+    "weight_log": "weight_log",
     "custom_food": "custom_foods.csv",
+    "recipes": "recipes.json",
+    "events": "events",
+    "device": "device.json",
     "food_db": "Enhanced_Indian_Food_Nutrition.csv",
     "exercise_db": "Compendium_of_Physical_Activities_2024.csv",
     "symptom_db": "symptom_database.csv",
 }
+# Crash-recovery journal for log writes that have not reached the partitions yet
+JOURNAL_FILE = "pending_writes.jsonl"
+# Snapshots (profile + custom foods + every log partition in one checksummed zip)
+SNAPSHOT_DIR = "backups"
+SNAPSHOT_FORMAT = 1
 # Hydration Constants
+MEAL_TYPES = ["Breakfast", "Lunch", "Dinner", "Snack"]
 HYDRATION_FACTORS = {
     "Water": 1.0, "Milk": 0.99, "Tea": 0.98, "Coffee": 0.90,
     "Juice": 0.95, "Soda": 0.90, "Alcohol": 0.80, "Sports Drink": 1.0
 }
 
 
-def initialize_databases():
-    """Creates necessary files if they don't exist."""
-
-    # 1. Logs
-    if not os.path.exists(FILES["water_log"]):
-        pd.DataFrame(columns=["Date", "Time", "Beverage", "Volume_ml", "Effective_Hydration_ml"]).to_csv(
-            FILES["water_log"], index=False)
-
-    if not os.path.exists(FILES["weight_log"]):
-        pd.DataFrame(columns=["Date", "Weight"]).to_csv(FILES["weight_log"], index=False)
-
-    if not os.path.exists(FILES["food_log"]):
-        pd.DataFrame(
-            columns=["Date", "Time", "Dish", "Meal Type", "Quantity", "Calories", "Protein", "Carbs", "Fats"]).to_csv(
-            FILES["food_log"], index=False)
-
-    if not os.path.exists(FILES["exercise_log"]):
-        pd.DataFrame(columns=["Date", "Time", "Activity", "Duration", "Calories Burnt"]).to_csv(FILES["exercise_log"],index=False)
+# Log schemas (logs are stored as one Parquet file per month: <log>/<YYYY-MM>.parquet)
+LOG_COLUMNS = {
+    FILES["food_log"]: ["Entry_ID", "Date", "Time", "Dish", "Meal Type", "Quantity", "Calories", "Protein", "Carbs",
+                        "Fats"],
+    FILES["exercise_log"]: ["Entry_ID", "Date", "Time", "Activity", "Duration", "Calories Burnt"],
+    FILES["water_log"]: ["Entry_ID", "Date", "Time", "Beverage", "Volume_ml", "Effective_Hydration_ml"],
+    FILES["weight_log"]: ["Entry_ID", "Date", "Weight"],
+}
+# Log columns stored as float; the rest (besides Date/Time) are text
+LOG_NUMERIC = {"Quantity", "Calories", "Protein", "Carbs", "Fats", "Duration", "Calories Burnt", "Volume_ml",
+               "Effective_Hydration_ml", "Weight"}
 
 
+def initialize_databases():
+    """Creates necessary log folders and migrates old CSV logs."""
 
-def load_data_safe(filepath):
+    # 1. Logs
+    for log_dir in LOG_COLUMNS:
+        legacy_csv = f"{log_dir}.csv"
+        if not os.path.isdir(log_dir):
+            # Migrate into a staging folder so an interrupted migration runs again on the next start
+            staging = log_dir + ".migrating"
+            shutil.rmtree(staging, ignore_errors=True)
+            os.makedirs(staging)
+            df_old = load_data_safe(legacy_csv)
+            if df_old is not None:
+                write_log_rows(log_dir, df_old, folder=staging)
+            os.replace(staging, log_dir)
+            if os.path.exists(legacy_csv):
+                os.replace(legacy_csv, legacy_csv + ".migrated")
+
+    # 2. Event log (existing log rows become this device's first events, even if a peer synced in first)
+    if device_id() not in _load_applied():
+        _bootstrap_events()
+
+    # 3. Background log writer (replays the journal left by a crash first)
+    LOG_WRITER.start()
+
+
+def load_data_safe(filepath, **read_kwargs):
     """Safely loads CSVs handling empty files."""
     if os.path.exists(filepath):
         try:
-            df = pd.read_csv(filepath)
+            df = pd.read_csv(filepath, **read_kwargs)
             if df.empty: return None
             return df
         except pd.errors.EmptyDataError:
@@ -89,9 +129,8 @@ def save_profile(name, age, gender, height, weight, activity, goal, water_goal):
         json.dump(profile, f)
 
     # Initialize Weight Log
-    if not os.path.exists(FILES["weight_log"]) or os.stat(FILES["weight_log"]).st_size == 0:
-        pd.DataFrame([{"Date": datetime.now().strftime("%Y-%m-%d"), "Weight": weight}]).to_csv(FILES["weight_log"],
-                                                                                               index=False)
+    if load_log(FILES["weight_log"]) is None:
+        log_data(FILES["weight_log"], {"Date": datetime.now().strftime("%Y-%m-%d"), "Weight": weight})
     return profile
 
 
@@ -107,12 +146,808 @@ def load_profile():
         return profile
     return None
 
-def log_data(file, data_dict):
-    df_new = pd.DataFrame([data_dict])
-    if not os.path.exists(file) or os.stat(file).st_size == 0:
-        df_new.to_csv(file, index=False)
-    else:
-        df_new.to_csv(file, mode='a', header=False, index=False)
+def _fill_entry_ids(ids):
+    """Gives rows without an Entry_ID (e.g. rows of a migrated CSV log) a new one.
+
+    A column with no IDs at all is float NaN, so the IDs are filled into an object copy.
+    """
+    ids = ids.astype(object)
+    missing = ids.isna()
+    ids[missing] = [uuid.uuid4().hex for _ in range(missing.sum())]
+    return ids.astype(str)
+
+
+def _parse_times(values, errors="coerce"):
+    """Parses HH:MM:SS times, and the HH:MM times of old CSV logs, into timedelta64."""
+    text = pd.Series(values, dtype=object).astype(str).str.strip()
+    text = text.mask(text.str.fullmatch(r"\d{1,2}:\d{2}"), text + ":00")
+    return pd.to_timedelta(text, errors=errors)
+
+
+def _coerce_log_types(df):
+    """Parses Date/Time once, on write, into datetime64 and timedelta64 columns, and numbers into floats."""
+    df = df.copy()
+    df["Entry_ID"] = _fill_entry_ids(df["Entry_ID"])
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce").dt.normalize()
+    if "Time" in df.columns:
+        df["Time"] = _parse_times(df["Time"]).set_axis(df.index)
+    for col in LOG_NUMERIC.intersection(df.columns):
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype(float)
+    return df.dropna(subset=["Date"])
+
+
+def coerce_log_row(log_dir, row, op="add"):
+    """Checks one row against LOG_COLUMNS and returns it with plain JSON values.
+
+    Raises ValueError for an unknown log or column, a missing or unreadable Date,
+    an unreadable Time, or a non-numeric value in a numeric column.
+    """
+    if log_dir not in LOG_COLUMNS:
+        raise ValueError(f"Unknown log: {log_dir}")
+    if op == "delete":
+        return {"Entry_ID": str(row["Entry_ID"])}
+    unknown = set(row) - set(LOG_COLUMNS[log_dir])
+    if unknown:
+        raise ValueError(f"Unknown columns for {log_dir}: {', '.join(sorted(unknown))}")
+
+    clean = {}
+    for col, value in row.items():
+        try:
+            if value is None or (np.isscalar(value) and pd.isna(value)):
+                clean[col] = None
+            elif col == "Date":
+                clean[col] = pd.Timestamp(value).strftime("%Y-%m-%d")
+            elif col == "Time":
+                secs = int(_parse_times([value], errors="raise").iloc[0].total_seconds())
+                clean[col] = f"{secs // 3600:02d}:{secs // 60 % 60:02d}:{secs % 60:02d}"
+            elif col in LOG_NUMERIC:
+                clean[col] = float(value)
+            else:
+                clean[col] = str(value)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid {col} {value!r} for {log_dir}: {e}") from None
+    if clean.get("Date") is None:
+        raise ValueError(f"Missing Date for {log_dir}")
+    return clean
+
+
+def _partition_path(log_dir, month):
+    return os.path.join(log_dir, f"{month}.parquet")
+
+
+def write_log_rows(log_dir, df_rows, folder=None):
+    """Appends rows to the monthly partitions they belong to (in `folder` instead of log_dir while migrating)."""
+    df_rows = _coerce_log_types(df_rows.reindex(columns=LOG_COLUMNS[log_dir]))
+    folder = folder or log_dir
+    os.makedirs(folder, exist_ok=True)
+    for month, part in df_rows.groupby(df_rows["Date"].dt.strftime("%Y-%m")):
+        path = _partition_path(folder, month)
+        if os.path.exists(path):
+            # Re-applying an entry (e.g. replay after a crash) replaces it instead of duplicating it
+            part = pd.concat([pd.read_parquet(path), part], ignore_index=True).drop_duplicates("Entry_ID", keep="last")
+        _write_partition(path, part)
+        if folder == log_dir and log_dir in _ENTRY_INDEX:
+            _ENTRY_INDEX[log_dir].update(dict.fromkeys(part["Entry_ID"], month))
+
+
+def _write_partition(path, part):
+    if part.empty:
+        if os.path.exists(path): os.remove(path)
+        return
+    tmp = path + ".tmp"
+    part.to_parquet(tmp, index=False)
+    with open(tmp, "rb") as f: os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# log folder -> {Entry_ID: month}, built on first use from the Entry_ID column only
+_ENTRY_INDEX = {}
+
+
+def _entry_index(log_dir):
+    if log_dir not in _ENTRY_INDEX:
+        index = {}
+        if os.path.isdir(log_dir):
+            for f in sorted(os.listdir(log_dir)):
+                if f.endswith(".parquet"):
+                    ids = pd.read_parquet(os.path.join(log_dir, f), columns=["Entry_ID"])["Entry_ID"]
+                    index.update(dict.fromkeys(ids, f[:-len(".parquet")]))
+        _ENTRY_INDEX[log_dir] = index
+    return _ENTRY_INDEX[log_dir]
+
+
+def _remove_entry(log_dir, entry_id):
+    """Drops one entry from the single partition holding it; returns the removed row (or None)."""
+    month = _entry_index(log_dir).pop(entry_id, None)
+    if month is None:
+        return None
+    path = _partition_path(log_dir, month)
+    part = pd.read_parquet(path)
+    hit = part["Entry_ID"] == entry_id
+    _write_partition(path, part[~hit])
+    return part[hit].iloc[0] if hit.any() else None
+
+
+def _read_partitions(log_dir, start=None, end=None):
+    if not os.path.isdir(log_dir):
+        return []
+    lo = pd.Timestamp(start).strftime("%Y-%m") if start is not None else ""
+    hi = pd.Timestamp(end).strftime("%Y-%m") if end is not None else "9999-99"
+    months = sorted(f[:-len(".parquet")] for f in os.listdir(log_dir) if f.endswith(".parquet"))
+    return [pd.read_parquet(_partition_path(log_dir, m)) for m in months if lo <= m <= hi]
+
+
+def load_log(log_dir, start=None, end=None):
+    """Loads a log with typed Date/Time columns, reading only the months in [start, end].
+
+    Adds, edits and deletes still waiting in the write-behind queue are included.
+    """
+    # Snapshot pending changes before reading disk so a concurrent flush can't hide one
+    pending = LOG_WRITER.pending_entries(log_dir)
+    parts = _read_partitions(log_dir, start, end)
+    upserts = [e["row"] for e in pending if e["op"] != "delete"]
+    deleted = {e["row"]["Entry_ID"] for e in pending if e["op"] == "delete"}
+    if upserts:
+        parts.append(_coerce_log_types(pd.DataFrame(upserts).reindex(columns=LOG_COLUMNS[log_dir])))
+    if not parts:
+        return None
+
+    df = pd.concat(parts, ignore_index=True).drop_duplicates("Entry_ID", keep="last")
+    df = df[~df["Entry_ID"].isin(deleted)]
+    if start is not None:
+        df = df[df["Date"] >= pd.Timestamp(start).normalize()]
+    if end is not None:
+        df = df[df["Date"] <= pd.Timestamp(end).normalize()]
+    if df.empty: return None
+    return df.reset_index(drop=True)
+
+
+class WriteBehindQueue:
+    """Coalesces log writes and flushes them in batches on a background thread.
+
+    Every row is appended to a journal before it is queued, so rows that were
+    accepted but not yet flushed are replayed on the next start after a crash.
+    A flush appends the batch to the event log, then applies it to the partitions.
+    """
+
+    def __init__(self, journal_path, batch_window=0.25):
+        self.journal_path = journal_path
+        self.batch_window = batch_window
+        self._queue = queue.Queue()
+        self._pending = []
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._journal = None
+        self._worker = None
+        self.failed = False
+
+    def start(self):
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._recover()
+            self._journal = open(self.journal_path, "a")
+            self._worker = threading.Thread(target=self._run, name="log-writer", daemon=True)
+            self._worker.start()
+
+    def put(self, log_dir, row, op="add"):
+        """Journals and queues one add/edit/delete. Raises ValueError for a row that doesn't fit the log."""
+        if op == "add": row = {"Entry_ID": uuid.uuid4().hex, **row}
+        row = coerce_log_row(log_dir, row, op)
+        if self._worker is None: self.start()
+        # Conflicting edits are ordered by when they were made, in UTC so devices in other time zones agree
+        entry = {"id": uuid.uuid4().hex, "log": log_dir, "op": op, "row": row, "ts": _utc_now()}
+        with self._lock:
+            self._journal.write(json.dumps(entry, default=str) + "\n")
+            self._journal.flush()
+            self._pending.append(entry)
+        self._queue.put(entry)
+        return entry["row"]["Entry_ID"]
+
+    def pending_entries(self, log_dir):
+        with self._lock:
+            return [e for e in self._pending if e["log"] == log_dir]
+
+    def flush(self, timeout=None):
+        """Blocks until every queued row is on disk.
+
+        Returns False on timeout, or if a batch failed since start (its rows stay in the
+        journal and are replayed on the next start).
+        """
+        with self._lock:
+            return self._idle.wait_for(lambda: not self._pending, timeout) and not self.failed
+
+    def _recover(self):
+        entries = []
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path) as f:
+                entries = [json.loads(line) for line in f if line.strip()]
+        if entries:
+            # Journaled rows that reached the event log before the crash are among its last len(entries) events
+            origin = device_id()
+            recent = read_events(origin, max(event_count(origin) - len(entries), 0))
+            key = lambda e: e.get("id") or e["row"]["Entry_ID"]
+            logged = {key(e) for e in recent}
+            append_local_events([e for e in entries if key(e) not in logged])
+        open(self.journal_path, "w").close()
+        # Also applies events a sync delivered while this device wasn't running
+        try:
+            apply_new_events(update_rolling=False)
+        except Exception:
+            # The events stay unapplied and are picked up by the next write or start
+            logger.exception("Could not apply new events on start")
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Let a burst of clicks settle, then take everything queued so far
+            time.sleep(self.batch_window)
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                self._write_batch(batch)
+            except Exception:
+                # Keep the thread alive; the batch is still in the journal for the next start
+                logger.exception("Log writer could not save %d entries; keeping them in %s",
+                                 len(batch), self.journal_path)
+                self._release(batch, failed=True)
+
+    @staticmethod
+    def _retry(action, attempts=5, delay=0.5):
+        """Runs action, retrying an OSError (e.g. a file briefly locked by a sync tool) with backoff."""
+        for attempt in range(1, attempts + 1):
+            try:
+                return action()
+            except OSError:
+                if attempt == attempts:
+                    raise
+                logger.warning("Log write failed (attempt %d of %d), retrying", attempt, attempts, exc_info=True)
+                time.sleep(delay * 2 ** (attempt - 1))
+
+    def _write_batch(self, batch):
+        with self._lock:
+            self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self._retry(lambda: append_local_events(batch))
+        self._retry(lambda: apply_new_events(update_rolling=False))
+        self._release(batch)
+
+    def _release(self, batch, failed=False):
+        with self._lock:
+            done = {id(e) for e in batch}
+            self._pending = [e for e in self._pending if id(e) not in done]
+            self.failed = self.failed or failed
+            if not self._pending:
+                if not self.failed:
+                    self._journal.seek(0)
+                    self._journal.truncate()
+                self._idle.notify_all()
+
+
+LOG_WRITER = WriteBehindQueue(JOURNAL_FILE)
+atexit.register(LOG_WRITER.flush, 5)
+# Seconds an action that reads the log files directly waits for queued writes
+FLUSH_TIMEOUT = 10
+
+
+def flush_log_writer(timeout=FLUSH_TIMEOUT):
+    """Waits for queued log writes; raises RuntimeError if they are not all on disk in time."""
+    if not LOG_WRITER.flush(timeout):
+        raise RuntimeError("Recent log entries are not saved yet. Try again in a moment, or restart the app "
+                           "to recover them.")
+
+
+# --- Event log & device sync ---
+# events/<origin>.jsonl holds one JSON event per line, appended only by its origin device
+# (or copied verbatim by sync). events/<origin>.idx holds the end offset of each line as
+# little-endian int64, so event N starts where entry N-1 ends and `seq` is the line number.
+# events/applied.json records how many events of each origin are reflected in the partitions.
+_EVENTS_LOCK = threading.RLock()
+
+
+def device_id(root="."):
+    path = os.path.join(root, FILES["device"])
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return json.load(f)["device_id"]
+    new_id = uuid.uuid4().hex[:12]
+    with open(path, "w") as f: json.dump({"device_id": new_id}, f)
+    return new_id
+
+
+def _event_paths(origin, root="."):
+    base = os.path.join(root, FILES["events"], origin)
+    return base + ".jsonl", base + ".idx"
+
+
+def _origins(root="."):
+    folder = os.path.join(root, FILES["events"])
+    if not os.path.isdir(folder):
+        return []
+    return sorted(f[:-len(".idx")] for f in os.listdir(folder) if f.endswith(".idx"))
+
+
+def event_count(origin, root="."):
+    idx = _event_paths(origin, root)[1]
+    return os.path.getsize(idx) // 8 if os.path.exists(idx) else 0
+
+
+def _read_event_bytes(origin, start, root="."):
+    """Raw lines of events start..end, located by seeking the offset index (never scans older events)."""
+    data_path, idx_path = _event_paths(origin, root)
+    count = event_count(origin, root)
+    if start >= count:
+        return []
+    with open(idx_path, "rb") as f:
+        f.seek(max(start - 1, 0) * 8)
+        ends = np.frombuffer(f.read((count - max(start - 1, 0)) * 8), dtype="<i8")
+    begin = int(ends[0]) if start > 0 else 0
+    ends = ends[1:] if start > 0 else ends
+    with open(data_path, "rb") as f:
+        f.seek(begin)
+        return f.read(int(ends[-1]) - begin).splitlines(keepends=True)
+
+
+def read_events(origin, start=0, root="."):
+    return [json.loads(line) for line in _read_event_bytes(origin, start, root)]
+
+
+def _append_event_lines(origin, lines, root="."):
+    """Appends raw event lines and their end offsets, fsyncing data before the index."""
+    if not lines:
+        return
+    data_path, idx_path = _event_paths(origin, root)
+    os.makedirs(os.path.dirname(data_path), exist_ok=True)
+    count = event_count(origin, root)
+    end = 0
+    if count:
+        with open(idx_path, "rb") as f:
+            f.seek((count - 1) * 8)
+            end = int(np.frombuffer(f.read(8), dtype="<i8")[0])
+
+    # Bytes past the last indexed event (a torn write) are dropped before appending
+    with open(data_path, "ab") as f:
+        f.truncate(end)
+        f.write(b"".join(lines))
+        f.flush()
+        os.fsync(f.fileno())
+    ends = end + np.cumsum([len(line) for line in lines], dtype="<i8")
+    with open(idx_path, "ab") as f:
+        f.truncate(count * 8)
+        f.write(ends.astype("<i8").tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _utc_now():
+    return datetime.now(timezone.utc).isoformat(timespec="microseconds")
+
+
+def append_local_events(entries, op="add"):
+    """Records journal entries ({"id", "log", "op", "row", "ts"}) as new events of this device."""
+    origin = device_id()
+    with _EVENTS_LOCK:
+        seq = event_count(origin)
+        now = _utc_now()
+        lines = [(json.dumps({"id": e.get("id") or uuid.uuid4().hex, "origin": origin, "seq": seq + i,
+                              "ts": e.get("ts") or now, "op": e.get("op", op),
+                              "log": e["log"], "row": e["row"]}, default=str) + "\n").encode()
+                 for i, e in enumerate(entries)]
+        _append_event_lines(origin, lines)
+
+
+def _load_applied():
+    path = os.path.join(FILES["events"], "applied.json")
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return json.load(f)
+    return {}
+
+
+def _save_applied(applied):
+    path = os.path.join(FILES["events"], "applied.json")
+    with open(path + ".tmp", "w") as f: json.dump(applied, f)
+    os.replace(path + ".tmp", path)
+
+
+def _load_resolved():
+    path = os.path.join(FILES["events"], "resolved.json")
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return json.load(f)
+    return {"edits": {}, "deleted": {}}
+
+
+def _save_resolved(resolved):
+    path = os.path.join(FILES["events"], "resolved.json")
+    with open(path + ".tmp", "w") as f: json.dump(resolved, f)
+    os.replace(path + ".tmp", path)
+
+
+def _rolling_add_row(log_dir, row, sign=1):
+    with _ROLLING_LOCK:
+        if _ROLLING["stats"] is not None:
+            _ROLLING["stats"].add_row(log_dir, row, sign)
+
+
+def _quarantine(event, error):
+    """Sets aside an event that can't be applied (events/quarantine.jsonl) so it can't block later ones."""
+    logger.warning("Quarantined event %s/%s: %s", event.get("origin"), event.get("seq"), error)
+    with open(os.path.join(FILES["events"], "quarantine.jsonl"), "a") as f:
+        f.write(json.dumps({"error": str(error), "event": event}, default=str) + "\n")
+
+
+def _apply_events(events, update_rolling, resolved):
+    """Applies events so that every device ends up with the same rows, whatever order they arrive in.
+
+    Per Entry_ID a delete is final, the edit with the highest (UTC edit time, origin, seq) wins, and an
+    add only creates an entry nothing else has touched yet. `resolved` records the winning
+    edit and the delete of each entry. Runs of adds are batched per log; edits and deletes
+    touch one partition each. Events whose row doesn't fit its log are quarantined.
+    """
+    adds = {}
+    overruled = False
+
+    def flush_adds():
+        for log_dir, rows in adds.items():
+            write_log_rows(log_dir, pd.DataFrame(rows))
+            if update_rolling:
+                for row in rows: _rolling_add_row(log_dir, row)
+        adds.clear()
+
+    for e in events:
+        try:
+            e = {**e, "row": coerce_log_row(e["log"], e["row"], e.get("op", "add"))}
+        except (KeyError, TypeError, ValueError) as err:
+            _quarantine(e, err)
+            continue
+        op, entry_id = e.get("op", "add"), e["row"]["Entry_ID"]
+        version = [e.get("ts", ""), e.get("origin", ""), e.get("seq", 0)]
+        if entry_id in resolved["deleted"]:
+            overruled = True
+            continue
+        if op == "add":
+            if entry_id not in resolved["edits"]:
+                adds.setdefault(e["log"], []).append(e["row"])
+            continue
+        if op == "edit":
+            if resolved["edits"].get(entry_id, version) > version:
+                overruled = True
+                continue
+            resolved["edits"][entry_id] = version
+        else:
+            resolved["deleted"][entry_id] = version
+            resolved["edits"].pop(entry_id, None)
+        flush_adds()
+        old = _remove_entry(e["log"], entry_id)
+        if e["op"] == "edit":
+            write_log_rows(e["log"], pd.DataFrame([e["row"]]))
+        if update_rolling:
+            if old is not None: _rolling_add_row(e["log"], old, -1)
+            if e["op"] == "edit": _rolling_add_row(e["log"], e["row"])
+    flush_adds()
+    if overruled and not update_rolling:
+        # Rolling stats already counted these local changes when they were made
+        invalidate_rolling_stats()
+
+
+def apply_new_events(update_rolling=True):
+    """Applies events not yet reflected in the log partitions; cost depends only on the new events."""
+    with _EVENTS_LOCK:
+        applied, resolved = _load_applied(), _load_resolved()
+        new = 0
+        for origin in _origins():
+            done, count = applied.get(origin, 0), event_count(origin)
+            if count > done:
+                _apply_events(read_events(origin, done), update_rolling, resolved)
+                _save_resolved(resolved)
+                applied[origin] = count
+                _save_applied(applied)
+                new += count - done
+        return new
+
+
+def _bootstrap_events():
+    """Turns log rows written before the event log existed into this device's first events.
+
+    Runs before any events a peer synced in are applied, so the partitions hold only this device's rows.
+    """
+    os.makedirs(FILES["events"], exist_ok=True)
+    for log_dir in LOG_COLUMNS:
+        for part in _read_partitions(log_dir):
+            rows = json.loads(part.to_json(orient="records", date_format="iso"))
+            append_local_events([{"log": log_dir, "row": r} for r in rows])
+    applied = _load_applied()
+    applied[device_id()] = event_count(device_id())
+    _save_applied(applied)
+
+
+def _copy_missing_events(src_root, dst_root, skip_origin=None):
+    """Copies, per origin, the events `dst_root` lacks from `src_root`. Returns the number copied."""
+    copied = 0
+    for origin in _origins(src_root):
+        have = event_count(origin, dst_root)
+        if origin == skip_origin or event_count(origin, src_root) <= have:
+            continue
+        lines = _read_event_bytes(origin, have, src_root)
+        _append_event_lines(origin, lines, dst_root)
+        copied += len(lines)
+    return copied
+
+
+def sync_with_peer(peer_dir):
+    """Two-way sync with another device's data folder, exchanging only the events each side lacks.
+
+    Events are keyed by (origin, seq), so repeating a sync copies nothing. The local logs
+    are updated right away; the peer applies what it received on its next start.
+    """
+    flush_log_writer()
+    with _EVENTS_LOCK:
+        peer_id = device_id(peer_dir) if os.path.exists(os.path.join(peer_dir, FILES["device"])) else None
+        received = _copy_missing_events(peer_dir, ".", skip_origin=device_id())
+        sent = _copy_missing_events(".", peer_dir, skip_origin=peer_id)
+        apply_new_events()
+    return received, sent
+
+
+# Rolling statistics: metric -> (log folder, column summed per day)
+ROLLING_WINDOWS = (7, 30, 90)
+ROLLING_METRICS = {
+    "Calories": (FILES["food_log"], "Calories"),
+    "Protein": (FILES["food_log"], "Protein"),
+    "Carbs": (FILES["food_log"], "Carbs"),
+    "Fats": (FILES["food_log"], "Fats"),
+    "Burnt": (FILES["exercise_log"], "Calories Burnt"),
+    "Hydration": (FILES["water_log"], "Effective_Hydration_ml"),
+}
+
+
+def _meets_target(metric, target, value):
+    if metric == "Burnt":
+        return value > 0
+    if metric in ("Protein", "Hydration"):
+        return value >= target
+    return abs(value - target) <= 0.1 * target
+
+
+class RollingWindow:
+    """Mean, variance and target adherence over the last `size` days.
+
+    Days live in a ring buffer (each day's total and number of entries) and the
+    window keeps running sums, so pushing a new day or adjusting a day already in
+    the window is O(1). Only days with at least one entry count as logged or on target.
+    """
+
+    def __init__(self, size, meets_target):
+        self.size = size
+        self.meets_target = meets_target
+        self._ring = [0.0] * size
+        self._entries = [0] * size
+        self._newest = -1
+        self._count = 0
+        self.total = self.total_sq = 0.0
+        self.hits = self.logged = 0
+
+    def _account(self, i, sign):
+        value = self._ring[i]
+        self.total += sign * value
+        self.total_sq += sign * value * value
+        if self._entries[i]:
+            self.hits += sign * bool(self.meets_target(value))
+            self.logged += sign
+
+    def push(self, value, entries):
+        self._newest = (self._newest + 1) % self.size
+        if self._count == self.size:
+            self._account(self._newest, -1)
+        else:
+            self._count += 1
+        self._ring[self._newest], self._entries[self._newest] = value, entries
+        self._account(self._newest, 1)
+
+    def adjust(self, days_ago, delta, entries_delta):
+        """Adds `delta` and `entries_delta` entries to a day already in the window (0 = newest day)."""
+        if days_ago < 0 or days_ago >= self._count:
+            return
+        i = (self._newest - days_ago) % self.size
+        self._account(i, -1)
+        self._entries[i] += entries_delta
+        # A day whose entries were all deleted is exactly empty again, without float residue
+        self._ring[i] = self._ring[i] + delta if self._entries[i] else 0.0
+        self._account(i, 1)
+
+    @property
+    def mean(self):
+        return self.total / self._count if self._count else 0.0
+
+    @property
+    def mean_logged(self):
+        """Average over days that have at least one entry."""
+        return self.total / self.logged if self.logged else 0.0
+
+    @property
+    def variance(self):
+        return max(self.total_sq / self._count - self.mean ** 2, 0.0) if self._count else 0.0
+
+    @property
+    def adherence(self):
+        """Percentage of days in the window that met the target."""
+        return 100 * self.hits / self._count if self._count else 0.0
+
+
+class RollingStats:
+    """Rolling windows for every metric in ROLLING_METRICS, kept up to date one day at a time."""
+
+    def __init__(self, targets, windows=ROLLING_WINDOWS):
+        self.targets = targets
+        self.last_day = None
+        # Entries dated after today: day -> {metric: (total, entries)}, pushed when that day arrives
+        self._future = {}
+        self.windows = {m: {n: RollingWindow(n, lambda v, m=m: _meets_target(m, targets.get(m, 0), v))
+                            for n in windows} for m in ROLLING_METRICS}
+
+    def push_day(self, values):
+        """Closes the window on one more day; `values` maps metric -> (that day's total, entries)."""
+        for metric, wins in self.windows.items():
+            for w in wins.values():
+                w.push(*values.get(metric, (0.0, 0)))
+        self.last_day += timedelta(days=1)
+
+    def advance_to(self, day):
+        while self.last_day < day:
+            self.push_day(self._future.pop(self.last_day + timedelta(days=1), {}))
+
+    def add(self, day, metric, delta, entries=1):
+        """Applies a change to one metric on `day` (e.g. a newly logged entry, or -1 entries for a delete).
+
+        Days after today are held back until they arrive, so they can't push real days out of the windows.
+        """
+        if day > pd.Timestamp(datetime.now().date()):
+            total, n = self._future.setdefault(day, {}).get(metric, (0.0, 0))
+            self._future[day][metric] = (total + delta, n + entries)
+            return
+        self.advance_to(day)
+        for w in self.windows[metric].values():
+            w.adjust((self.last_day - day).days, delta, entries)
+
+    def add_row(self, log_dir, row, sign=1):
+        day = pd.Timestamp(row["Date"]).normalize()
+        for metric, (m_log, column) in ROLLING_METRICS.items():
+            if m_log == log_dir and pd.notna(row.get(column)):
+                self.add(day, metric, sign * float(row[column]), sign)
+
+    def window(self, metric, size):
+        return self.windows[metric][size]
+
+    def summary(self):
+        rows = []
+        for metric, wins in self.windows.items():
+            row = {"Metric": metric}
+            for n, w in wins.items():
+                row[f"{n}d Avg"] = w.mean
+                row[f"{n}d Std"] = w.variance ** 0.5
+                row[f"{n}d On Target %"] = w.adherence
+            rows.append(row)
+        return pd.DataFrame(rows).set_index("Metric")
+
+
+_ROLLING = {"key": None, "stats": None}
+_ROLLING_LOCK = threading.RLock()
+
+
+def _rolling_targets(user):
+    t = user["Targets"]
+    carb_per, _, fats_per = t["Macros_Split"]
+    return {"Calories": t["Calories"], "Protein": t["Protein"], "Hydration": t["Water"],
+            "Carbs": t["Calories"] * carb_per / 100 / 4, "Fats": t["Calories"] * fats_per / 100 / 9}
+
+
+def _build_rolling_stats(targets):
+    today = pd.Timestamp(datetime.now().date())
+    start = today - timedelta(days=max(ROLLING_WINDOWS) - 1)
+    daily = {}
+    for metric, (log_dir, column) in ROLLING_METRICS.items():
+        df = load_log(log_dir, start=start)
+        daily[metric] = {day: (float(total), int(n)) for day, (total, n) in
+                         df.groupby("Date")[column].agg(["sum", "count"]).iterrows()} if df is not None else {}
+
+    stats = RollingStats(targets)
+    stats.last_day = start - timedelta(days=1)
+    for day in pd.date_range(start, today):
+        stats.push_day({m: d[day] for m, d in daily.items() if day in d})
+    for metric, d in daily.items():
+        for day, (total, n) in d.items():
+            if day > today: stats.add(day, metric, total, n)
+    return stats
+
+
+def get_rolling_stats(user):
+    """7/30/90-day rolling statistics, built from the logs once and then updated incrementally."""
+    targets = _rolling_targets(user)
+    key = json.dumps(targets, sort_keys=True)
+    with _ROLLING_LOCK:
+        if _ROLLING["stats"] is None or _ROLLING["key"] != key:
+            _ROLLING.update(key=key, stats=_build_rolling_stats(targets))
+        _ROLLING["stats"].advance_to(pd.Timestamp(datetime.now().date()))
+        return _ROLLING["stats"]
+
+
+def invalidate_rolling_stats():
+    with _ROLLING_LOCK:
+        _ROLLING["stats"] = None
+
+
+def log_data(log_dir, data_dict):
+    with _ROLLING_LOCK:
+        entry_id = LOG_WRITER.put(log_dir, data_dict)
+        _rolling_add_row(log_dir, data_dict)
+    return entry_id
+
+
+def get_entry(log_dir, entry_id):
+    """One log entry as a plain dict, found via the entry index (reads a single partition)."""
+    for e in reversed(LOG_WRITER.pending_entries(log_dir)):
+        if e["row"]["Entry_ID"] == entry_id:
+            return None if e["op"] == "delete" else dict(e["row"])
+    month = _entry_index(log_dir).get(entry_id)
+    if month is None:
+        return None
+    part = pd.read_parquet(_partition_path(log_dir, month))
+    row = part[part["Entry_ID"] == entry_id]
+    return json.loads(row.to_json(orient="records", date_format="iso"))[0] if not row.empty else None
+
+
+# Amount column of each log that its calculated columns scale with
+AMOUNT_COLUMNS = {FILES["food_log"]: "Quantity", FILES["exercise_log"]: "Duration", FILES["water_log"]: "Volume_ml"}
+
+
+def _rescale_derived(log_dir, old, changes):
+    """Keeps calculated columns in step when the amount of an entry is edited.
+
+    Raises ValueError if the new amount is empty or not positive, or if the old amount is
+    0 or missing, so there is nothing to scale from.
+    """
+    changes = dict(changes)
+    amount = AMOUNT_COLUMNS.get(log_dir)
+    if amount in changes:
+        if changes[amount] is None or pd.isna(changes[amount]) or changes[amount] <= 0:
+            raise ValueError(f"{amount} must be greater than 0.")
+        if amount != "Volume_ml" and (old.get(amount) is None or pd.isna(old[amount]) or old[amount] <= 0):
+            raise ValueError(f"This entry has no {amount} to scale from; delete it and log it again.")
+
+    if log_dir == FILES["food_log"] and "Quantity" in changes:
+        factor = changes["Quantity"] / old["Quantity"]
+        for c in ("Calories", "Protein", "Carbs", "Fats"):
+            changes.setdefault(c, old[c] * factor)
+    elif log_dir == FILES["exercise_log"] and "Duration" in changes:
+        changes.setdefault("Calories Burnt", old["Calories Burnt"] * changes["Duration"] / old["Duration"])
+    elif log_dir == FILES["water_log"] and ("Volume_ml" in changes or "Beverage" in changes):
+        volume = changes.get("Volume_ml", old["Volume_ml"])
+        changes.setdefault("Effective_Hydration_ml", volume * HYDRATION_FACTORS.get(changes.get("Beverage", old["Beverage"]), 1.0))
+    return changes
+
+
+def update_entry(log_dir, entry_id, changes):
+    """Edits one entry in place; only its partition is rewritten and rolling stats move by the delta."""
+    old = get_entry(log_dir, entry_id)
+    if old is None:
+        return False
+    new = {**old, **_rescale_derived(log_dir, old, changes), "Entry_ID": entry_id}
+    with _ROLLING_LOCK:
+        LOG_WRITER.put(log_dir, new, op="edit")
+        _rolling_add_row(log_dir, old, -1)
+        _rolling_add_row(log_dir, new)
+    return True
+
+
+def delete_entry(log_dir, entry_id):
+    old = get_entry(log_dir, entry_id)
+    if old is None:
+        return False
+    with _ROLLING_LOCK:
+        LOG_WRITER.put(log_dir, {"Entry_ID": entry_id}, op="delete")
+        _rolling_add_row(log_dir, old, -1)
+    return True
 
 def log_beverage_advanced(date_obj, time_obj, beverage, volume):
     factor = HYDRATION_FACTORS.get(beverage, 1.0)
@@ -126,56 +961,284 @@ def log_beverage_advanced(date_obj, time_obj, beverage, volume):
 
 
 
+def _guess_diet(dish_name):
+    return "Non-Veg" if any(k in str(dish_name).lower() for k in ["chicken", "egg", "fish", "mutton"]) else "Veg"
+
+
+@st.cache_data
 def load_all_databases():
     df_food = load_data_safe(FILES["food_db"])
     df_custom = load_data_safe(FILES["custom_food"])
+    df_recipes = load_recipe_foods(df_food)
 
-    if df_food is not None and df_custom is not None:
-        df_food = pd.concat([df_custom, df_food], ignore_index=True)
-    elif df_custom is not None:
-        df_food = df_custom
+    extra = [df for df in (df_custom, df_recipes) if df is not None]
+    if df_food is not None and extra:
+        df_food = pd.concat([*extra, df_food], ignore_index=True)
+    elif extra:
+        df_food = pd.concat(extra, ignore_index=True)
 
-    df_ex = load_data_safe(FILES["exercise_db"])
+    df_ex = load_activity_table()[0]
     df_sym = load_data_safe(FILES["symptom_db"])
 
     
-    if df_food is not None and "Diet" not in df_food.columns:
-        df_food["Diet"] = df_food["Dish Name"].apply(
-            lambda x: "Non-Veg" if any(k in str(x).lower() for k in ["chicken", "egg", "fish", "mutton"]) else "Veg")
+    if df_food is not None:
+        guessed = df_food["Dish Name"].apply(_guess_diet)
+        df_food["Diet"] = df_food["Diet"].fillna(guessed) if "Diet" in df_food.columns else guessed
+        df_food = add_food_scores(df_food)
 
     return df_food, df_ex, df_sym
+
+
+GOALS = ["Weight Loss", "Muscle Gain", "Weight Gain", "Maintain"]
+# Goal fit = weighted sum of percentile scores (0-1, 0.5 where a dish lacks the data); negative weights penalise
+GOAL_WEIGHTS = {
+    "Weight Loss": {"Protein Density": 0.4, "Fibre Density": 0.3, "Low Calorie": 0.3, "Sodium Penalty": -0.2},
+    "Muscle Gain": {"Protein": 0.6, "Protein Density": 0.3, "Sodium Penalty": -0.1},
+    "Weight Gain": {"Calorie": 0.5, "Protein": 0.3, "Fibre Density": 0.2, "Sodium Penalty": -0.1},
+    "Maintain": {"Protein Density": 0.35, "Fibre Density": 0.35, "Sodium Penalty": -0.3},
+}
+
+
+def add_food_scores(df_food):
+    """Adds per-dish score columns plus a 'Rank: <goal>' column (0 = best fit) for every goal."""
+    df_food = df_food.reset_index(drop=True)
+    # Missing values stay NaN and get a neutral percentile instead of ranking as 0
+    col = lambda name: df_food.get(name, pd.Series(np.nan, index=df_food.index)).astype(float)
+    per_kcal = lambda num, den: num / den.where(den > 0)
+    percentile = lambda values: values.rank(pct=True).fillna(0.5)
+    kcal = col("Calories per Serving")
+    kcal_100g = col("Calories (kcal)")
+
+    df_food["Protein Density"] = per_kcal(col("Protein per Serving (g)"), kcal)
+    df_food["Fibre Density"] = per_kcal(col("Fibre (g)"), kcal_100g)
+    df_food["Sodium Penalty"] = per_kcal(col("Sodium (mg)"), kcal_100g)
+
+    pct = {
+        "Protein Density": percentile(df_food["Protein Density"]),
+        "Fibre Density": percentile(df_food["Fibre Density"]),
+        "Sodium Penalty": percentile(df_food["Sodium Penalty"]),
+        "Protein": percentile(col("Protein per Serving (g)")),
+        "Calorie": percentile(kcal),
+        "Low Calorie": percentile(-kcal),
+    }
+    for goal, weights in GOAL_WEIGHTS.items():
+        fit = sum(w * pct[name] for name, w in weights.items())
+        df_food[f"Fit: {goal}"] = fit
+        df_food[f"Rank: {goal}"] = fit.rank(ascending=False, method="first").astype(int) - 1
+    return df_food
+
+
+def goal_order(df_food, goal):
+    """Row positions of df_food from best to worst fit, read off the precomputed rank in O(n)."""
+    order = np.empty(len(df_food), dtype=int)
+    order[df_food[f"Rank: {goal}"].to_numpy()] = np.arange(len(df_food))
+    return order
+
+
+# Per-100 g nutrient columns of the reference food database that recipes aggregate
+RECIPE_NUTRIENTS = ["Calories (kcal)", "Carbohydrates (g)", "Protein (g)", "Fats (g)", "Free Sugar (g)",
+                    "Fibre (g)", "Sodium (mg)", "Calcium (mg)", "Iron (mg)", "Vitamin C (mg)", "Folate (µg)",
+                    "Cholesterol (mg)"]
+
+
+def load_recipes():
+    if os.path.exists(FILES["recipes"]):
+        with open(FILES["recipes"], "r") as f:
+            return json.load(f)
+    return {}
+
+
+def _write_recipes(recipes):
+    tmp = FILES["recipes"] + ".tmp"
+    with open(tmp, "w") as f: json.dump(recipes, f, indent=1)
+    os.replace(tmp, FILES["recipes"])
+
+
+def save_recipe(name, ingredients):
+    """Stores a recipe as {dish: grams}; each save bumps its version and drops its cached totals.
+
+    Raises ValueError if a reference or custom dish already has the name, since that dish would be hidden.
+    """
+    name = name.strip()
+    for key in ("food_db", "custom_food"):
+        df = load_data_safe(FILES[key])
+        if df is not None and name.lower() in set(df["Dish Name"].dropna().astype(str).str.strip().str.lower()):
+            raise ValueError(f"'{name}' is already a dish in the food database. Please choose another name.")
+    recipes = load_recipes()
+    version = recipes.get(name, {}).get("version", 0) + 1
+    recipes[name] = {"version": version, "ingredients": {d: float(g) for d, g in ingredients.items() if g > 0}}
+    _write_recipes(recipes)
+
+
+def compute_recipe_totals(df_ref, recipes):
+    """Nutrient totals for many recipes in one product: grams (recipes x dishes) @ per-gram (dishes x nutrients)."""
+    dishes = sorted({d for r in recipes.values() for d in r["ingredients"]})
+    col = {d: i for i, d in enumerate(dishes)}
+    per_gram = df_ref.drop_duplicates("Dish Name").set_index("Dish Name").reindex(dishes)[RECIPE_NUTRIENTS]
+    per_gram = per_gram.fillna(0).to_numpy() / 100
+
+    grams = np.zeros((len(recipes), len(dishes)))
+    for i, r in enumerate(recipes.values()):
+        for d, g in r["ingredients"].items():
+            grams[i, col[d]] = g
+    return pd.DataFrame(grams @ per_gram, index=list(recipes), columns=RECIPE_NUTRIENTS)
+
+
+def _ingredient_hashes(df_ref):
+    """One hash per reference dish over its nutrient values, so edits to a dish invalidate dependent recipes."""
+    hashes = pd.util.hash_pandas_object(df_ref[RECIPE_NUTRIENTS], index=False)
+    return dict(zip(df_ref["Dish Name"], hashes.astype(str)))
+
+
+def get_recipe_totals(df_ref, recipes=None):
+    """Per-recipe nutrient totals, recomputing only recipes whose version or ingredient data changed."""
+    recipes = load_recipes() if recipes is None else recipes
+    if not recipes:
+        return pd.DataFrame(columns=RECIPE_NUTRIENTS)
+
+    dish_hash = _ingredient_hashes(df_ref)
+    fingerprints = {name: hashlib.sha1("|".join(f"{d}:{dish_hash.get(d)}" for d in sorted(r["ingredients"]))
+                                        .encode()).hexdigest() for name, r in recipes.items()}
+    stale = {name: r for name, r in recipes.items()
+             if r.get("cached_version") != r["version"] or r.get("fingerprint") != fingerprints[name]}
+
+    if stale:
+        fresh = compute_recipe_totals(df_ref, stale)
+        for name in stale:
+            recipes[name].update({"cached_version": recipes[name]["version"], "fingerprint": fingerprints[name],
+                                  "totals": fresh.loc[name].round(3).to_dict()})
+        _write_recipes(recipes)
+    return pd.DataFrame.from_dict({name: r["totals"] for name, r in recipes.items()}, orient="index")
+
+
+def load_recipe_foods(df_ref):
+    """Recipes as food-database rows (one serving = the whole recipe), so they log like any dish."""
+    recipes = load_recipes()
+    if df_ref is None or not recipes:
+        return None
+    totals = get_recipe_totals(df_ref, recipes)
+    grams = np.array([sum(recipes[n]["ingredients"].values()) for n in totals.index], dtype=float)
+    # Per-100 g values like the reference rows, which the goal-fit scores read
+    per_100g = totals[["Calories (kcal)", "Fibre (g)", "Sodium (mg)"]].div(
+        np.where(grams > 0, grams, np.nan), axis=0) * 100
+    return pd.DataFrame({
+        "Dish Name": totals.index,
+        "Calories per Serving": totals["Calories (kcal)"].to_numpy(),
+        "Protein per Serving (g)": totals["Protein (g)"].to_numpy(),
+        "Carbohydrates (g)": totals["Carbohydrates (g)"].to_numpy(),
+        "Fats (g)": totals["Fats (g)"].to_numpy(),
+        "Serving Unit": "1 recipe",
+        "Serving Weight (g)": grams,
+        "Calories (kcal)": per_100g["Calories (kcal)"].to_numpy(),
+        "Fibre (g)": per_100g["Fibre (g)"].to_numpy(),
+        "Sodium (mg)": per_100g["Sodium (mg)"].to_numpy(),
+        "Diet": ["Non-Veg" if "Non-Veg" in map(_guess_diet, recipes[n]["ingredients"]) else "Veg"
+                 for n in totals.index],
+    })
+
+
+@st.cache_data
+def load_activity_table():
+    """Compendium indexed by Activity Code, plus the activity codes of each Category.
+
+    A missing or empty Compendium gives an empty table and no categories.
+    """
+    df_ex = load_data_safe(FILES["exercise_db"], dtype={"Activity Code": str})
+    if df_ex is None:
+        df_ex = pd.DataFrame(columns=["Category", "Activity Code", "MET Value", "Description"])
+    df_ex = df_ex.set_index("Activity Code")
+    categories = {cat: list(codes) for cat, codes in sorted(df_ex.groupby("Category").groups.items())}
+    return df_ex, categories
+
+
+def estimate_burn(activity_codes, minutes, weight_kg, df_ex=None):
+    """Calories burnt (MET x kg x hours) for arrays of activity codes, durations and weights.
+
+    Inputs broadcast against each other; unknown activity codes give NaN.
+    """
+    if df_ex is None: df_ex = load_activity_table()[0]
+    met = df_ex["MET Value"].reindex(np.atleast_1d(activity_codes)).to_numpy()
+    return met * np.asarray(weight_kg, dtype=float) * (np.asarray(minutes, dtype=float) / 60)
 def get_daily_stats():
-    today = datetime.now().strftime("%Y-%m-%d")
+    today = datetime.now().date()
     stats = {"eaten": 0, "protein": 0, "burnt": 0}
 
-    df_food = load_data_safe(FILES["food_log"])
-    if df_food is not None:
-        day = df_food[df_food["Date"] == today]
+    day = load_log(FILES["food_log"], start=today, end=today)
+    if day is not None:
         stats["eaten"] = day["Calories"].sum()
         stats["protein"] = day["Protein"].sum()
 
-    df_ex = load_data_safe(FILES["exercise_log"])
-    if df_ex is not None:
-        day = df_ex[df_ex["Date"] == today]
+    day = load_log(FILES["exercise_log"], start=today, end=today)
+    if day is not None:
         stats["burnt"] = day["Calories Burnt"].sum()
     return stats
 
 
-def show_food_log(df_food):
+def _format_time(times, fmt="%H:%M:%S"):
+    """timedelta64 time-of-day column -> clock strings."""
+    return (pd.Timestamp(0) + times).dt.strftime(fmt)
+
+
+def show_entry_editor(log_dir, df_log, key, editable):
+    """Table of log entries where rows can be ticked for deletion and the columns in `editable`
+    ({column: st.column_config}) can be changed.
+
+    Saving sends one point edit/delete per changed row, addressed by Entry_ID. The (hidden)
+    index is the Entry_ID, so pending edits are dropped whenever the listed rows change.
+    """
+    if df_log is None:
+        st.info("Nothing logged yet.")
+        return
+    df_log = df_log.sort_values(["Date", "Time"] if "Time" in df_log else ["Date"], ascending=False)
+    view = df_log.set_index("Entry_ID").assign(Delete=False)
+    view["Date"] = view["Date"].dt.date
+    if "Time" in view:
+        view["Time"] = _format_time(view["Time"], "%H:%M")
+
+    editor_key = f"{key}_{st.session_state.get(f'{key}_version', 0)}"
+    st.data_editor(view, key=editor_key, hide_index=True, use_container_width=True, column_config=editable,
+                   disabled=[c for c in view.columns if c not in editable and c != "Delete"])
+    changes = st.session_state[editor_key]["edited_rows"]
+    if changes and st.button("Save Changes", key=f"{key}_save"):
+        empty = sorted({c for vals in changes.values() if not vals.get("Delete")
+                        for c, v in vals.items() if v is None or v == 0})
+        if empty:
+            st.error(f"{', '.join(empty)} can't be empty or 0. Nothing was saved.")
+            return
+        errors = []
+        for pos, vals in changes.items():
+            vals = dict(vals)
+            entry_id = view.index[int(pos)]
+            try:
+                if vals.pop("Delete", False): delete_entry(log_dir, entry_id)
+                elif vals: update_entry(log_dir, entry_id, vals)
+            except ValueError as e:
+                errors.append(str(e))
+        if errors:
+            st.error(" ".join(errors))
+            return
+        # A fresh editor key drops the applied edits from the widget state
+        st.session_state[f"{key}_version"] = st.session_state.get(f"{key}_version", 0) + 1
+        st.rerun()
+
+
+def show_food_log(df_food, user=None):
     st.title("🍎 Nutrition Logger")
-    tab1, tab2 = st.tabs(["Log Meal", "Add Custom Food"])
+    tab1, tab2, tab3, tab4 = st.tabs(["Log Meal", "Add Custom Food", "Build Recipe", "History"])
 
     with tab1:
         c_d, c_t, c_m = st.columns(3)
         with c_d: log_date = st.date_input("Date", datetime.now())
         with c_t: log_time = st.time_input("Time", datetime.now())
-        with c_m: meal_type = st.selectbox("Meal Type", ["Breakfast", "Lunch", "Dinner", "Snack"])
+        with c_m: meal_type = st.selectbox("Meal Type", MEAL_TYPES)
         st.divider()
 
         search = st.text_input("Search Database", placeholder="Type 'Paneer', 'Rice', 'Chicken'...")
         if search and df_food is not None:
-            matches = df_food[df_food["Dish Name"].str.lower().str.contains(search.lower())]
+            ranked = df_food.iloc[goal_order(df_food, user["Goal"])] if user is not None else df_food
+            matches = ranked[ranked["Dish Name"].str.lower().str.contains(search.lower(), regex=False)]
             if not matches.empty:
+                if user is not None: st.caption(f"Best matches for {user['Goal']} first")
                 dish = st.selectbox("Select Dish", matches["Dish Name"].unique())
                 sel = df_food[df_food["Dish Name"] == dish].iloc[0]
                 qty = st.number_input("Quantity (Servings)", 0.5, 10.0, 1.0)
@@ -211,6 +1274,34 @@ def show_food_log(df_food):
                 st.success("Saved!")
                 st.cache_data.clear()
 
+    with tab3:
+        df_ref = load_data_safe(FILES["food_db"])
+        if df_ref is not None:
+            r_name = st.text_input("Recipe Name", key="recipe_name")
+            picks = st.multiselect("Ingredients", df_ref["Dish Name"], key="recipe_ingredients")
+            weights = df_ref.set_index("Dish Name")["Serving Weight (g)"]
+            grams = {d: st.number_input(f"{d} (g)", 0.0, 5000.0, float(weights[d]), key=f"recipe_g_{d}")
+                     for d in picks}
+            if picks:
+                preview = compute_recipe_totals(df_ref, {"preview": {"ingredients": grams}}).iloc[0]
+                st.info(f"Total: {preview['Calories (kcal)']:.0f} kcal | Protein: {preview['Protein (g)']:.1f} g | "
+                        f"Carbs: {preview['Carbohydrates (g)']:.1f} g | Fats: {preview['Fats (g)']:.1f} g")
+            if st.button("Save Recipe") and r_name and picks:
+                try:
+                    save_recipe(r_name, grams)
+                except ValueError as e:
+                    st.error(str(e))
+                else:
+                    st.success("Recipe saved! Search for it in 'Log Meal'.")
+                    st.cache_data.clear()
+
+    with tab4:
+        st.caption("Last 30 days. Change the quantity or meal type, or tick Delete, then save.")
+        show_entry_editor(FILES["food_log"], load_log(FILES["food_log"], start=datetime.now().date() - timedelta(days=30)),
+                          "food_history",
+                          {"Meal Type": st.column_config.SelectboxColumn(options=MEAL_TYPES, required=True),
+                           "Quantity": st.column_config.NumberColumn(min_value=0.5, max_value=10.0, required=True)})
+
 def show_hydration(user):
     st.title("💧 Hydration Tracker")
     c1, c2 = st.columns([1, 2])
@@ -227,19 +1318,21 @@ def show_hydration(user):
 
     with c2:
         st.subheader("History")
-        df_w = load_data_safe(FILES["water_log"])
-        if df_w is not None:
-            d_str = h_date.strftime("%Y-%m-%d")
-            df_w["Date"] = df_w["Date"].astype(str)
-            day_data = df_w[df_w["Date"] == d_str]
-            if not day_data.empty:
-                tot = day_data["Effective_Hydration_ml"].sum()
-                st.metric("Effective Hydration", f"{tot:.0f} ml", f"Goal: {user['Targets']['Water']} ml")
-                st.progress(min(tot / user['Targets']['Water'], 1.0))
-                st.plotly_chart(px.pie(day_data, values="Volume_ml", names="Beverage", hole=0.4),
-                                use_container_width=True)
-            else:
-                st.info("No data for this date.")
+        day_data = load_log(FILES["water_log"], start=h_date, end=h_date)
+        if day_data is not None:
+            tot = day_data["Effective_Hydration_ml"].sum()
+            st.metric("Effective Hydration", f"{tot:.0f} ml", f"Goal: {user['Targets']['Water']} ml")
+            st.progress(min(tot / user['Targets']['Water'], 1.0))
+            st.plotly_chart(px.pie(day_data, values="Volume_ml", names="Beverage", hole=0.4),
+                            use_container_width=True)
+        else:
+            st.info("No data for this date.")
+        with st.expander("✏️ Edit Entries"):
+            show_entry_editor(FILES["water_log"], day_data, "water_history",
+                              {"Beverage": st.column_config.SelectboxColumn(options=list(HYDRATION_FACTORS),
+                                                                            required=True),
+                               "Volume_ml": st.column_config.NumberColumn(min_value=50, max_value=2000, step=50,
+                                                                          required=True)})
 def show_health_advisor(df_sym):
     st.title("🩺 Advanced Symptom Checker")
     if df_sym is not None:
@@ -267,25 +1360,31 @@ def show_fitness(user, df_ex):
         st.subheader("Log Workout")
         ex_date = st.date_input("Date", datetime.now())
         ex_time = st.time_input("Time", datetime.now())
+        categories = load_activity_table()[1]
         search_ex = st.text_input("Search Activity")
-        if search_ex and df_ex is not None:
-            matches = df_ex[df_ex["Description"].str.lower().str.contains(search_ex.lower())]
-            if not matches.empty:
-                act = st.selectbox("Activity", matches["Description"].unique())
-                met = matches[matches["Description"] == act].iloc[0]["MET Value"]
-                mins = st.number_input("Duration (Mins)", 10, 180, 30)
-                burn = met * user["Current_Weight"] * (mins / 60)
-                st.success(f"Estimated Burn: {burn:.0f} kcal")
-                if st.button("Log Workout"):
-                    log_data(FILES["exercise_log"],
-                             {"Date": ex_date.strftime("%Y-%m-%d"), "Time": ex_time.strftime("%H:%M:%S"),
-                              "Activity": act, "Duration": mins, "Calories Burnt": burn})
-                    st.success("Logged!")
+        if not categories:
+            st.error("Activity database is missing or could not be loaded.")
+            codes = []
+        elif search_ex:
+            # A search covers every category
+            hits = df_ex["Description"].str.contains(search_ex, case=False, regex=False, na=False)
+            codes = list(df_ex.index[hits])
+        else:
+            codes = categories[st.selectbox("Category", list(categories))]
+        if codes:
+            code = st.selectbox("Activity", codes, format_func=lambda c: df_ex.at[c, "Description"])
+            mins = st.number_input("Duration (Mins)", 10, 180, 30)
+            burn = float(estimate_burn(code, mins, user["Current_Weight"], df_ex)[0])
+            st.success(f"Estimated Burn: {burn:.0f} kcal")
+            if st.button("Log Workout"):
+                log_data(FILES["exercise_log"],
+                         {"Date": ex_date.strftime("%Y-%m-%d"), "Time": ex_time.strftime("%H:%M:%S"),
+                          "Activity": df_ex.at[code, "Description"], "Duration": mins, "Calories Burnt": burn})
+                st.success("Logged!")
     with c2:
         st.subheader("History")
-        df_ex_log = load_data_safe(FILES["exercise_log"])
-        if df_ex_log is not None:
-            st.dataframe(df_ex_log.sort_index(ascending=False), use_container_width=True)
+        show_entry_editor(FILES["exercise_log"], load_log(FILES["exercise_log"]), "exercise_history",
+                          {"Duration": st.column_config.NumberColumn(min_value=10, max_value=180, required=True)})
 
 
 
@@ -293,14 +1392,11 @@ def generate_meal_plan(df_food, target_cals, goal, diet_pref, days=3):
     plan = {}
     budgets = {"Breakfast": 0.25, "Lunch": 0.35, "Dinner": 0.30, "Snack": 0.10}
 
+    # Precomputed ranks give the goal order without sorting; filtering keeps that order
+    df_food = df_food.iloc[goal_order(df_food, goal)]
     if diet_pref == "Vegetarian":
         df_food = df_food[df_food["Diet"] == "Veg"]
 
-    if goal == "Muscle Gain":
-        df_food = df_food.sort_values(by="Protein per Serving (g)", ascending=False)
-    elif goal == "Weight Loss":
-        df_food = df_food.sort_values(by="Calories per Serving", ascending=True)
-
     for day in range(1, days + 1):
         day_meals = []
         total_day = 0
@@ -310,7 +1406,7 @@ def generate_meal_plan(df_food, target_cals, goal, diet_pref, days=3):
                 (df_food["Calories per Serving"] >= budget - 150) & (df_food["Calories per Serving"] <= budget + 150)]
             if candidates.empty: candidates = df_food  
 
-            selected = candidates.sample(1).iloc[0]
+            selected = candidates.head(10).sample(1).iloc[0]
             qty = max(0.5, min(round(budget / selected["Calories per Serving"], 1), 3.0))
             cals = int(selected["Calories per Serving"] * qty)
 
@@ -354,14 +1450,12 @@ def show_analytics_ad():
     st.header("📊 Nutrition Analytics")
 
    
-    df_log = load_data_safe(FILES["food_log"])
+    df_log = load_log(FILES["food_log"])
 
     if df_log is None or df_log.empty:
         st.info("No data available. Go to 'Input Meal Logs' to add data.")
         return
 
-    df_log["Date"] = pd.to_datetime(df_log["Date"])
-
     
     st.subheader("📅 Daily Calorie Intake")
     
@@ -384,7 +1478,7 @@ def show_analytics_ad():
     c1,c2=st.columns(2)
     with c1:
         st.markdown("#### **Actual Intake**")
-        filter=df_log["Date"]==pd.to_datetime(selected_date)
+        filter=df_log["Date"]==pd.Timestamp(selected_date)
         day_data=df_log[filter]
         if day_data is not None and not day_data.empty:
             day_prot=day_data["Protein"].sum()
@@ -421,6 +1515,13 @@ def show_analytics_ad():
 
 
 
+    # --- Rolling Averages ---
+    st.subheader("📈 Rolling Averages")
+    user = load_profile()
+    if user is not None:
+        st.dataframe(get_rolling_stats(user).summary().round(1), use_container_width=True)
+        st.caption("Averages include days with nothing logged. 'On Target %' is the share of days that met your goal.")
+
     # --- CHART 3: Weekly Summaries (Bar Chart) ---
     st.subheader("wk Weekly Summaries")
 
@@ -438,6 +1539,100 @@ def show_analytics_ad():
 
 
 
+def _snapshot_members():
+    """Yields (archive name, local path) for every file holding user data."""
+    for key in ("profile", "custom_food", "recipes"):
+        if os.path.exists(FILES[key]): yield FILES[key], FILES[key]
+    for log_dir in LOG_COLUMNS:
+        if os.path.isdir(log_dir):
+            for f in sorted(os.listdir(log_dir)):
+                if f.endswith(".parquet"): yield f"{log_dir}/{f}", os.path.join(log_dir, f)
+    if os.path.isdir(FILES["events"]):
+        for f in sorted(os.listdir(FILES["events"])):
+            if f.endswith((".jsonl", ".idx", "applied.json", "resolved.json")):
+                yield f"{FILES['events']}/{f}", os.path.join(FILES["events"], f)
+
+
+def _copy_hashed(src, dst):
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: src.read(1 << 20), b""):
+        digest.update(chunk)
+        dst.write(chunk)
+    return digest.hexdigest()
+
+
+def create_snapshot(path=None):
+    """Packs the profile and all logs into one compressed zip with a sha256 manifest.
+
+    Files are streamed into the archive in 1 MB chunks, one partition at a time.
+    """
+    flush_log_writer()
+    if path is None:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        path = os.path.join(SNAPSHOT_DIR, f"fitlife_{datetime.now():%Y%m%d_%H%M%S}.zip")
+
+    manifest = {"format": SNAPSHOT_FORMAT, "created": datetime.now().isoformat(), "files": {}}
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, local in _snapshot_members():
+            with open(local, "rb") as src, zf.open(name, "w") as dst:
+                manifest["files"][name] = _copy_hashed(src, dst)
+        zf.writestr("manifest.json", json.dumps(manifest, indent=1))
+    return path
+
+
+def restore_snapshot(archive):
+    """Verifies every checksum in a snapshot, then replaces the profile and logs with its contents.
+
+    The device then gets a new device ID. Its own event log was rolled back, so new events
+    under the old ID would reuse sequence numbers that peers already hold for other events.
+    """
+    flush_log_writer()
+    restorable = {FILES["profile"], FILES["custom_food"], FILES["recipes"], FILES["events"], *LOG_COLUMNS}
+    staging = SNAPSHOT_DIR + "_restore_tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+
+    try:
+        with zipfile.ZipFile(archive) as zf:
+            manifest = json.loads(zf.read("manifest.json"))
+            if manifest.get("format") != SNAPSHOT_FORMAT:
+                raise ValueError(f"Unsupported snapshot format: {manifest.get('format')}")
+            for name, expected in manifest["files"].items():
+                if name.split("/")[0] not in restorable or ".." in name:
+                    raise ValueError(f"Unexpected file in snapshot: {name}")
+                target = os.path.join(staging, name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with zf.open(name) as src, open(target, "wb") as dst:
+                    if _copy_hashed(src, dst) != expected:
+                        raise ValueError(f"Checksum mismatch for {name}")
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    for name in restorable:
+        if os.path.isdir(name): shutil.rmtree(name)
+        elif os.path.exists(name): os.remove(name)
+        staged = os.path.join(staging, name)
+        if os.path.exists(staged): os.replace(staged, name)
+    shutil.rmtree(staging, ignore_errors=True)
+    if os.path.exists(FILES["device"]): os.remove(FILES["device"])
+    if os.path.isdir(FILES["events"]):
+        # The restored rows are events already, so the new device ID has none of its own to bootstrap
+        applied = _load_applied()
+        applied[device_id()] = 0
+        _save_applied(applied)
+    invalidate_rolling_stats()
+    _ENTRY_INDEX.clear()
+
+
+def _export_csv(df_log):
+    """A log as CSV in the same layout the old CSV logs used (plain dates and HH:MM:SS times, no Entry_ID)."""
+    df_log = df_log.drop(columns="Entry_ID")
+    df_log["Date"] = df_log["Date"].dt.strftime("%Y-%m-%d")
+    if "Time" in df_log:
+        df_log["Time"] = _format_time(df_log["Time"])
+    return df_log.to_csv(index=False)
+
+
 def show_settings(user):
     st.title("⚙️ Settings")
     with st.expander("✏️ Edit Profile"):
@@ -459,19 +1654,65 @@ def show_settings(user):
     st.divider()
     st.subheader("⬇️ Export Data")
     c1, c2, c3 = st.columns(3)
-    if os.path.exists(FILES["food_log"]):
-        with open(FILES["food_log"], "rb") as f: c1.download_button("Download Food Log", f, "food_log.csv")
-    if os.path.exists(FILES["exercise_log"]):
-        with open(FILES["exercise_log"], "rb") as f: c2.download_button("Download Exercise Log", f,
-                                                                        "exercise_log.csv")
-    if os.path.exists(FILES["weight_log"]):
-        with open(FILES["weight_log"], "rb") as f: c3.download_button("Download Weight Log", f, "weight_log.csv")
+    for col, key, label in [(c1, "food_log", "Download Food Log"), (c2, "exercise_log", "Download Exercise Log"),
+                            (c3, "weight_log", "Download Weight Log")]:
+        df_export = load_log(FILES[key])
+        if df_export is not None:
+            col.download_button(label, _export_csv(df_export), f"{key}.csv")
+
+    st.divider()
+    st.subheader("💾 Backup & Restore")
+    b1, b2 = st.columns(2)
+    with b1:
+        if st.button("Create Backup"):
+            try:
+                st.session_state["backup_path"] = create_snapshot()
+            except RuntimeError as e:
+                st.error(f"Could not create backup: {e}")
+        if os.path.exists(st.session_state.get("backup_path", "")):
+            path = st.session_state["backup_path"]
+            with open(path, "rb") as f: st.download_button("Download Backup", f, os.path.basename(path))
+    with b2:
+        upload = st.file_uploader("Restore from Backup", type="zip")
+        if upload is not None and st.button("Restore"):
+            try:
+                restore_snapshot(upload)
+            except (ValueError, KeyError, RuntimeError, zipfile.BadZipFile) as e:
+                st.error(f"Could not restore backup: {e}")
+            else:
+                st.cache_data.clear()
+                del st.session_state["user"]
+                st.rerun()
+
+    st.divider()
+    st.subheader("🔄 Sync Devices")
+    peer_dir = st.text_input("Other device's data folder", placeholder="/path/to/other/fitlife")
+    if st.button("Sync Now") and peer_dir:
+        if not os.path.isdir(peer_dir):
+            st.error("Folder not found.")
+        else:
+            try:
+                received, sent = sync_with_peer(peer_dir)
+            except RuntimeError as e:
+                st.error(f"Could not sync: {e}")
+            else:
+                st.success(f"Synced! Received {received} and sent {sent} entries.")
 
     st.divider()
-    if st.button("🗑️ Reset All Data (Irreversible)", type="primary"):
-        for f in FILES.values():
+    st.caption(f"A backup is saved to `{SNAPSHOT_DIR}/` before resetting.")
+    if st.button("🗑️ Reset All Data", type="primary"):
+        try:
+            create_snapshot()
+        except RuntimeError as e:
+            st.error(f"Nothing was reset because the backup failed: {e}")
+            return
+        for key, f in FILES.items():
             
-            if "db" not in f and os.path.exists(f): os.remove(f)
+            if key.endswith("_db"): continue
+            if os.path.isdir(f): shutil.rmtree(f)
+            elif os.path.exists(f): os.remove(f)
+        invalidate_rolling_stats()
+        _ENTRY_INDEX.clear()
         del st.session_state["user"]
         st.rerun()
 
@@ -502,8 +1743,7 @@ def calculate_streak(df_food):
     if df_food is None or df_food.empty: return 0
 
    
-    df_food["DateObj"] = pd.to_datetime(df_food["Date"], errors='coerce')
-    valid_dates = df_food["DateObj"].dropna().dt.date.unique()
+    valid_dates = df_food["Date"].dt.date.unique()
 
     if len(valid_dates) == 0:
         return 0
@@ -536,12 +1776,11 @@ def show_dashboard(user):
     with col3:
         st.metric("Protein", f"{stats['protein']:.0f}g", f"Goal: {user['Targets']['Protein']}g")
 
-    df_w = load_data_safe(FILES["water_log"])
+    today = datetime.now().date()
+    df_w = load_log(FILES["water_log"], start=today, end=today)
     w_today = 0
     if df_w is not None:
-        df_w["Date"] = pd.to_datetime(df_w["Date"], errors='coerce')
-        today = datetime.now().strftime("%Y-%m-%d")
-        w_today = df_w[df_w["Date"] == today]["Effective_Hydration_ml"].sum()
+        w_today = df_w["Effective_Hydration_ml"].sum()
     with col4:
         st.metric("Hydration", f"{w_today:.0f} ml", f"Goal: {user['Targets']['Water']} ml")
 
@@ -561,7 +1800,7 @@ def show_dashboard(user):
         st.plotly_chart(fig, use_container_width=True)
 
     with c_streak:
-        df_f = load_data_safe(FILES["food_log"])
+        df_f = load_log(FILES["food_log"])
         streak = calculate_streak(df_f)
         st.subheader("🔥 Streak")
         st.metric("Consecutive Days", f"{streak} 🔥")
@@ -577,19 +1816,19 @@ def generate_smart_insights():
 
     # 1. Load Data
     user = load_profile()
-    df_food = load_data_safe(FILES["food_log"])
-    df_ex = load_data_safe(FILES["exercise_log"])
-    df_water = load_data_safe(FILES["water_log"])
+    df_food = load_log(FILES["food_log"])
+    df_ex = load_log(FILES["exercise_log"])
+    df_water = load_log(FILES["water_log"], start=datetime.now().date())
 
     if user is None: return ["Please create your profile first."]
 
    
+    rolling = get_rolling_stats(user)
     if df_food is not None:
-        df_food["Date"] = pd.to_datetime(df_food["Date"])
-        recent_days = df_food[df_food["Date"] >= (datetime.now() - timedelta(days=3))]
+        week = rolling.window("Calories", 7)
 
-        if not recent_days.empty:
-            avg_cal = recent_days.groupby("Date")["Calories"].sum().mean()
+        if week.logged:
+            avg_cal = week.mean_logged
             target_cal = user["Targets"]["Calories"]
             diff = avg_cal - target_cal
 
@@ -602,6 +1841,11 @@ def generate_smart_insights():
             else:
                 insights.append(f"✅ **Calorie Control:** You are within range of your calorie goals. Keep it up!")
 
+        prot_week = rolling.window("Protein", 7)
+        if prot_week.logged and prot_week.adherence < 50:
+            insights.append(
+                f"🥩 **Protein Goal:** You hit your protein target on only {prot_week.hits} of the last 7 days. Add a protein source to each main meal.")
+
    
     if df_food is not None:
        
@@ -614,8 +1858,7 @@ def generate_smart_insights():
 
    
     if df_water is not None:
-        df_water["Date"] = pd.to_datetime(df_water["Date"])
-        today_vol = df_water[df_water["Date"].dt.date == datetime.now().date()]["Effective_Hydration_ml"].sum()
+        today_vol = df_water["Effective_Hydration_ml"].sum()
         goal_water = user["Targets"]["Water"]
 
         
@@ -625,7 +1868,6 @@ def generate_smart_insights():
 
    
     if df_ex is not None:
-        df_ex["Date"] = pd.to_datetime(df_ex["Date"])
         last_workout = df_ex["Date"].max()
         days_since = (datetime.now() - last_workout).days
 
@@ -636,7 +1878,7 @@ def generate_smart_insights():
     
     if df_food is not None:
        
-        late_night = df_food[df_food["Time"] > "22:00:00"]
+        late_night = df_food[df_food["Time"] > pd.Timedelta(hours=22)]
         if not late_night.empty:
             insights.append(
                 f"🌙 **Late Snacking:** We noticed food logs after 10 PM. Late eating can disrupt sleep and digestion. Try herbal tea instead.")
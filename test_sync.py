@@ -0,0 +1,119 @@
+"""Two data folders standing in for two devices, synced through sync_with_peer().
+
+    python -m pytest test_sync.py
+"""
+import pytest
+
+import newback as nb
+
+
+def start(monkeypatch, folder):
+    """Starts the backend in `folder` the way app.py does on launch."""
+    nb.LOG_WRITER.flush(10)
+    monkeypatch.chdir(folder)
+    monkeypatch.setattr(nb, "LOG_WRITER", nb.WriteBehindQueue(nb.JOURNAL_FILE))
+    nb._ENTRY_INDEX.clear()
+    nb.invalidate_rolling_stats()
+    nb.initialize_databases()
+
+
+def meal(qty=1.0):
+    return {"Date": "2026-10-01", "Time": "12:30:00", "Dish": "Dal", "Meal Type": "Lunch", "Quantity": qty,
+            "Calories": 300 * qty, "Protein": 12 * qty, "Carbs": 40 * qty, "Fats": 8 * qty}
+
+
+def logs():
+    """Every log as sorted records, to compare one device with another."""
+    assert nb.LOG_WRITER.flush(10)
+    out = {}
+    for log_dir in nb.LOG_COLUMNS:
+        df = nb.load_log(log_dir)
+        out[log_dir] = [] if df is None else df.sort_values("Entry_ID").to_dict("records")
+    return out
+
+
+@pytest.fixture
+def devices(tmp_path, monkeypatch):
+    a, b = tmp_path / "a", tmp_path / "b"
+    a.mkdir(), b.mkdir()
+    start(monkeypatch, a)
+    return a, b
+
+
+def sync_both_ways(monkeypatch, a, b):
+    """Syncs a with b, starts b so it applies what it received, and returns both devices' logs."""
+    start(monkeypatch, a)
+    nb.sync_with_peer(str(b))
+    logs_a = logs()
+    start(monkeypatch, b)
+    # b applies what it received on start, before syncing itself
+    assert logs() == logs_a
+    nb.sync_with_peer(str(a))
+    logs_b = logs()
+    start(monkeypatch, a)
+    assert logs() == logs_a
+    return logs_a, logs_b
+
+
+def test_delete_beats_concurrent_edit(devices, monkeypatch):
+    a, b = devices
+    x = nb.log_data(nb.FILES["food_log"], meal())
+    sync_both_ways(monkeypatch, a, b)
+
+    start(monkeypatch, b)
+    assert nb.update_entry(nb.FILES["food_log"], x, {"Quantity": 3.0})
+    start(monkeypatch, a)
+    assert nb.delete_entry(nb.FILES["food_log"], x)
+
+    logs_a, logs_b = sync_both_ways(monkeypatch, a, b)
+    assert logs_a == logs_b
+    assert logs_a[nb.FILES["food_log"]] == []
+    assert nb.sync_with_peer(str(b)) == (0, 0)
+
+
+def test_concurrent_edits_converge_on_latest(devices, monkeypatch):
+    a, b = devices
+    x = nb.log_data(nb.FILES["food_log"], meal())
+    sync_both_ways(monkeypatch, a, b)
+
+    start(monkeypatch, a)
+    nb.update_entry(nb.FILES["food_log"], x, {"Quantity": 2.0})
+    start(monkeypatch, b)
+    nb.update_entry(nb.FILES["food_log"], x, {"Quantity": 4.0})
+
+    logs_a, logs_b = sync_both_ways(monkeypatch, a, b)
+    assert logs_a == logs_b
+    assert [r["Quantity"] for r in logs_a[nb.FILES["food_log"]]] == [4.0]
+
+
+def test_restore_does_not_reuse_event_numbers(devices, monkeypatch, tmp_path):
+    a, b = devices
+    nb.log_data(nb.FILES["food_log"], meal(1.0))
+    snapshot = nb.create_snapshot(str(tmp_path / "snap.zip"))
+    nb.log_data(nb.FILES["food_log"], meal(2.0))
+    sync_both_ways(monkeypatch, a, b)
+
+    start(monkeypatch, a)
+    nb.restore_snapshot(snapshot)
+    start(monkeypatch, a)
+    nb.log_data(nb.FILES["food_log"], meal(5.0))
+
+    logs_a, logs_b = sync_both_ways(monkeypatch, a, b)
+    assert logs_a == logs_b
+    assert sorted(r["Quantity"] for r in logs_a[nb.FILES["food_log"]]) == [1.0, 2.0, 5.0]
+
+
+def test_legacy_rows_survive_a_sync_before_first_start(devices, monkeypatch):
+    a, b = devices
+    (b / "food_log.csv").write_text("Date,Time,Dish,Meal Type,Quantity,Calories,Protein,Carbs,Fats\n"
+                                    "2026-09-30,08:00,Idli,Breakfast,2,150,5,30,1\n")
+    nb.log_data(nb.FILES["food_log"], meal())
+    nb.sync_with_peer(str(b))
+
+    start(monkeypatch, b)
+    nb.sync_with_peer(str(a))
+    logs_b = logs()
+    start(monkeypatch, a)
+    logs_a = logs()
+    assert logs_a == logs_b
+    assert sorted(r["Dish"] for r in logs_a[nb.FILES["food_log"]]) == ["Dal", "Idli"]